@@ -6,29 +6,45 @@ Usage:
   python parse_chats.py file1.txt file2.txt file3.txt --output ../web/public/knowledge.json
 
 Requires:
-  pip install anthropic
+  pip install anthropic orjson
   export ANTHROPIC_API_KEY=your_key_here
 """
 
 import re
-import json
 import sys
 import os
 import argparse
+import asyncio
+import random
+import hashlib
+import io
+import tempfile
+from collections import Counter
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import date
 
 import anthropic
+import orjson
 
 # ──────────────────────────────────────────────────────────────────────
 # PARSING
 # ──────────────────────────────────────────────────────────────────────
 
 MSG_RE = re.compile(
-    r'^\[(\d{1,2}/\d{1,2}/\d{2,4}),\s+\d{1,2}:\d{2}(?::\d{2})?\s*[APap][Mm]\]\s+[~\s]*([^:]+):\s*(.+)',
-    re.MULTILINE
+    # Matched per line with .match(), which anchors at the start by itself
+    r'\[(\d{1,2}/\d{1,2}/\d{2,4}),\s+\d{1,2}:\d{2}(?::\d{2})?\s*[APap][Mm]\]\s+[~\s]*([^:]+):\s*(.+)'
 )
 
+# Start of a timestamped export line; anything else continues the open message
+HEADER_RE = re.compile(r'\[\d{1,2}/\d{1,2}/\d{2,4},\s')
+
+# @mentions like @⁨~Name⁩, and the same plus bare URLs in one pass (used only
+# to detect messages with nothing but mentions/links)
+MENTION_RE = re.compile(r'@⁨[^⁩]+⁩')
+STRIP_RE = re.compile(r'@⁨[^⁩]+⁩|https?://\S+')
+
 # System / noise messages to skip entirely
 SKIP_IF_CONTAINS = [
     'joined from the community',
@@ -56,7 +72,7 @@ SKIP_IF_CONTAINS = [
 ]
 
 # Short social acknowledgments with no useful content
-SKIP_EXACT = {
+SKIP_EXACT = frozenset({
     'yes', 'no', 'ok', 'okay', 'sure', 'great', 'perfect', 'thanks',
     'thank you', 'thank you!', 'thanks!', 'amazing', 'awesome', 'love this',
     'love it', 'same', 'same here', 'me too', 'agreed', 'absolutely',
@@ -65,7 +81,10 @@ SKIP_EXACT = {
     '❤️', '🙏', '👍', '😍', '🥰', '💕', '♥️', '❤', '🤍', '💛',
     'welcome!', 'welcome', 'hi!', 'hi', 'hello', 'haha', 'lol',
     'yay!', 'yay', 'so cute!', 'so cute', 'congrats!', 'congrats',
-}
+})
+
+# Trailing punctuation/emoji stripped before the SKIP_EXACT lookup
+STRIP_CHARS = '!.,? 🎉🎊😊😀'
 
 # Pure logistics / coordination phrases (walk meetup chatter)
 COORDINATION_PHRASES = [
@@ -78,50 +97,76 @@ COORDINATION_PHRASES = [
     "walking over", "walking up", "walking down",
 ]
 
-
-def is_coordination(text: str) -> bool:
-    tl = text.lower()
-    if len(text) < 80:  # short messages are more likely to be coordination
-        for phrase in COORDINATION_PHRASES:
-            if phrase in tl:
-                return True
-    return False
+# Literal alternations: one C-level scan per message finds any phrase,
+# instead of one Python-level `in` check per phrase
+SKIP_RE = re.compile('|'.join(map(re.escape, SKIP_IF_CONTAINS)))
+COORD_RE = re.compile('|'.join(map(re.escape, COORDINATION_PHRASES)))
 
 
-def parse_file(path: str, source_name: str) -> list[dict]:
+def is_coordination(text: str) -> bool:
+    # Only short messages are treated as coordination; check length before lowering
+    return len(text) < 80 and COORD_RE.search(text.lower()) is not None
+
+
+def iter_messages(path: str, offset: int = 0):
+    """Stream (date, sender, text) per message from an export, starting at byte
+    `offset`, without loading the file into memory.
+
+    Every message starts with a `[date, time] sender:` line (iOS exports prefix
+    media/system lines with U+200E); lines without that timestamp prefix
+    continue the message before them.
+    """
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        f = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+        header = None
+        parts = []
+        for line in f:
+            line = line.lstrip('\u200e')
+            if HEADER_RE.match(line):
+                # Any timestamped line ends the open message. Ones MSG_RE
+                # rejects (system notices) are dropped with their continuation lines.
+                if header:
+                    yield header[0], header[1], '\n'.join(parts)
+                m = MSG_RE.match(line)
+                header = m.groups()[:2] if m else None
+                parts = [m.group(3)] if m else []
+            elif header:
+                parts.append(line.rstrip('\n'))
+        if header:
+            yield header[0], header[1], '\n'.join(parts)
+
+
+def parse_file(path: str, source_name: str, offset: int = 0) -> list[dict]:
     """Parse a WhatsApp export .txt file into clean message dicts."""
-    content = Path(path).read_text(encoding='utf-8', errors='replace')
-
     messages = []
-    for m in MSG_RE.finditer(content):
-        date_str, sender, text = m.groups()
-        text = text.strip()
-
-        # Remove @mentions like @⁨~Name⁩
-        text = re.sub(r'@⁨[^⁩]+⁩', '', text).strip()
-        # Remove URLs (keep them if they're the only content? No, skip URL-only messages)
-        text_no_url = re.sub(r'https?://\S+', '', text).strip()
-
-        if not text_no_url:
+    for date_str, sender, text in iter_messages(path, offset):
+        # Skip messages that are empty once mentions and URLs are removed
+        if not STRIP_RE.sub('', text).strip():
             continue
 
-        # Skip system/noise messages
-        if any(skip in text for skip in SKIP_IF_CONTAINS):
-            continue
+        # Remove @mentions; URLs stay so links reach the extraction prompt
+        text = MENTION_RE.sub('', text).strip()
 
-        # Skip very short acknowledgments
-        clean = text.lower().strip('!.,? 🎉🎊😊😀')
-        if clean in SKIP_EXACT:
-            continue
+        # Filters run cheapest/most selective first, so most rejects never
+        # reach the substring scan.
 
         # Skip very short messages (< 20 chars)
         if len(text) < 20:
             continue
 
+        # Skip very short acknowledgments
+        if text.lower().strip(STRIP_CHARS) in SKIP_EXACT:
+            continue
+
         # Skip pure coordination
         if is_coordination(text):
             continue
 
+        # Skip system/noise messages
+        if SKIP_RE.search(text):
+            continue
+
         messages.append({
             'text': text,
             'source': source_name,
@@ -136,7 +181,7 @@ def parse_file(path: str, source_name: str) -> list[dict]:
 
 SYSTEM_PROMPT = """You are an expert at extracting useful, searchable knowledge from community chat conversations.
 
-You will receive messages from a NYC Upper West Side moms WhatsApp group. Your job is to:
+You will receive messages from a NYC Upper West Side moms WhatsApp group, split into sections marked "=== SECTION N ===". Your job is to:
 1. Identify messages containing genuinely useful, searchable knowledge (recommendations, tips, resources, advice)
 2. Extract each piece of knowledge as a structured item
 3. IGNORE: social coordination (walk timing, "I'm on my way"), vague small talk, pure emotional responses
@@ -154,75 +199,301 @@ Use these categories (use the EXACT name):
 - "UWS Local Tips" — parks, playgrounds, bike spots, local resources, events
 - "Parenting Tips" — feeding advice, sleep tips, health, development
 
-Output a JSON array. Each item:
-{
-  "category": "exact category name",
-  "title": "concise title under 60 chars",
-  "content": "useful description with key details (names, addresses, prices, age ranges, specific notes)",
-  "tags": ["tag1", "tag2", "tag3"]  // 2-4 lowercase tags
-}
+Output JSON Lines: one compact JSON object per line, no array wrapper, no indentation. Each line:
+{"category": "exact category name", "title": "concise title under 60 chars", "content": "useful description with key details (names, addresses, prices, age ranges, specific notes)", "tags": ["tag1", "tag2", "tag3"]}
+(tags: 2-4 lowercase tags)
 
 Rules:
 - Never include the names of the people who posted — only the information they shared
 - DO include names of doctors, businesses, products — these are the useful facts
 - If multiple messages discuss the same thing, combine into one item
-- Return [] if no useful knowledge found in this batch
-- Return ONLY a JSON array, no other text"""
+- Process every section, and output items from all sections together
+- Output nothing if no useful knowledge found in any section
+- Output ONLY the JSON lines, no markdown, no commentary"""
 
 
-def extract_knowledge(client: anthropic.Anthropic, messages: list[dict]) -> list[dict]:
-    """Use Claude Haiku to extract knowledge items from a batch of messages."""
-    text = "\n".join(f"• {m['text']}" for m in messages)
+MODEL = "claude-haiku-4-5-20251001"
+
+# Messages per delimited section; several sections are packed into one API
+# call so fewer round-trips are spent on the same messages
+SECTION_SIZE = 50
+
+# Markdown code fences the model sometimes wraps its JSON in
+FENCE_OPEN_RE = re.compile(r'^```[\w-]*\s*')
+FENCE_CLOSE_RE = re.compile(r'\s*```$')
+
+# Words that signal a message is sharing a recommendation or resource. Word
+# boundaries keep e.g. "tip" from matching "multiple" or "class" "classic".
+KNOWLEDGE_RE = re.compile(
+    r"\b(?:recommend\w*|dr\.?\s|doctors?|pediatric\w*|ob/?gyns?|class(?:es)?|highly"
+    r"|check out|best|tips?|nann(?:y|ies)|daycares?|formula|strollers?|restaurants?)\b"
+    r"|\$\d|\.com\b|www\.",
+    re.IGNORECASE
+)
+
+
+def has_knowledge(messages: list[dict]) -> bool:
+    """True if any message looks informative (long-form or a keyword hit)."""
+    return any(len(m['text']) >= 120 or KNOWLEDGE_RE.search(m['text']) for m in messages)
+
+
+# Max API calls in flight at once (keep under the Anthropic rate limit)
+CONCURRENCY = 8
+
+# Transient statuses (rate limit, server errors, overloaded) worth retrying
+# on top of the client's own retries, rather than dropping the batch
+RETRY_STATUSES = {429, 500, 502, 503, 529}
+# Errors sent as SSE events mid-stream arrive with the stream's HTTP 200
+# status, so they are recognised by error type instead
+RETRY_ERROR_TYPES = {'overloaded_error', 'rate_limit_error', 'api_error'}
+MAX_ATTEMPTS = 4
+
+# Extraction results keyed by hash of (model, prompt, batch text), so
+# re-running over the same exports skips batches already sent to Claude
+CACHE_DIR = Path('.cache/extract')
+
+
+def cache_path(text: str) -> Path:
+    key = hashlib.sha256(f"{MODEL}\0{SYSTEM_PROMPT}\0{text}".encode('utf-8')).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+
+def write_cache(path: Path, items: list[dict]) -> None:
+    """Write atomically so an interrupted run never leaves a truncated entry.
+
+    The temp file name is unique, so identical batches in one run can't race.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as tmp:
+        tmp.write(orjson.dumps(items))
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+
+
+async def request_completion(client: anthropic.AsyncAnthropic, text: str) -> tuple[str, str | None]:
+    """Send one batch to Claude and return (streamed reply text, stop_reason)."""
+    # Stream so the event loop can service other batches while this one decodes
+    buf = []
+    async with client.messages.stream(
+        model=MODEL,
+        max_tokens=8192,
+        system=SYSTEM_PROMPT,
+        messages=[{
+            "role": "user",
+            "content": f"Extract knowledge from these chat messages:\n\n{text}"
+        }]
+    ) as stream:
+        async for chunk in stream.text_stream:
+            buf.append(chunk)
+        message = await stream.get_final_message()
+    return ''.join(buf).strip(), message.stop_reason
+
+
+def is_retryable(e: anthropic.APIStatusError) -> bool:
+    if e.status_code in RETRY_STATUSES or e.status_code == 200:
+        return True
+    body = e.body if isinstance(e.body, dict) else {}
+    error = body.get('error', body)
+    return isinstance(error, dict) and error.get('type') in RETRY_ERROR_TYPES
+
+
+async def request_with_retry(client: anthropic.AsyncAnthropic, text: str) -> tuple[str, str | None]:
+    """Retry transient API failures with exponential backoff plus jitter."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await request_completion(client, text)
+        except anthropic.APIStatusError as e:
+            if not is_retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = min(60, 2 ** attempt + random.random())
+            print(f"  Retrying batch in {delay:.1f}s (HTTP {e.status_code})", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+
+def parse_reply(raw: str) -> tuple[list[dict], int]:
+    """Parse a model reply into (items, number of malformed lines).
+
+    Accepts JSON Lines (the requested format) or, as a fallback, a JSON
+    array, either optionally wrapped in a markdown code fence:
+
+    >>> parse_reply('```jsonl\\n{"title": "a"}\\n{"title": "b"}\\n```')
+    ([{'title': 'a'}, {'title': 'b'}], 0)
+    >>> parse_reply('```json\\n[\\n  {"title": "a"}\\n]\\n```')
+    ([{'title': 'a'}], 0)
+    """
+    raw = FENCE_OPEN_RE.sub('', raw)
+    raw = FENCE_CLOSE_RE.sub('', raw)
+
+    if raw.startswith('['):
+        # The model fell back to a JSON array (one-line or pretty-printed)
+        return [item for item in orjson.loads(raw) if isinstance(item, dict)], 0
+
+    # One object per line; a malformed line only loses that item, not the
+    # whole batch
+    items = []
+    malformed = 0
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            print(f"  Warning: skipped malformed item ({line[:60]!r})", file=sys.stderr)
+            malformed += 1
+            continue
+        if isinstance(item, dict):
+            items.append(item)
+    return items, malformed
+
+
+async def extract_knowledge(client: anthropic.AsyncAnthropic, messages: list[dict]) -> tuple[list[dict], bool]:
+    """Use Claude Haiku to extract knowledge items from a batch of messages.
+
+    Returns (items, complete); complete is False when the batch failed, so
+    callers know its messages still need extracting on a later run.
+    """
+    # Sections with no informative message are pure chatter and are left out
+    # of the prompt; if every section is chatter, skip the API call entirely
+    sections = [messages[i:i+SECTION_SIZE] for i in range(0, len(messages), SECTION_SIZE)]
+    sections = [section for section in sections if has_knowledge(section)]
+    if not sections:
+        return [], True
+
+    text = "\n".join(
+        f"=== SECTION {n} ===\n" + "\n".join(f"• {m['text']}" for m in section)
+        for n, section in enumerate(sections, 1)
+    )
+
+    cached = cache_path(text)
+    if cached.exists():
+        return orjson.loads(cached.read_bytes()), True
 
     try:
-        response = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=2048,
-            system=SYSTEM_PROMPT,
-            messages=[{
-                "role": "user",
-                "content": f"Extract knowledge from these chat messages:\n\n{text}"
-            }]
-        )
-
-        raw = response.content[0].text.strip()
-        # Strip markdown code fences if present
-        raw = re.sub(r'^```(?:json)?\s*', '', raw)
-        raw = re.sub(r'\s*```$', '', raw)
-
-        items = json.loads(raw)
-        return items if isinstance(items, list) else []
+        raw, stop_reason = await request_with_retry(client, text)
+
+        items, malformed = parse_reply(raw)
+
+        # Only cache complete results, so a re-run retries partial batches
+        if malformed or stop_reason == 'max_tokens':
+            print(f"  Warning: partial batch ({malformed} malformed, stop_reason={stop_reason}); not cached",
+                  file=sys.stderr)
+            return items, False
+
+        # The reply is already paid for; a cache failure must not discard it
+        try:
+            write_cache(cached, items)
+        except OSError as e:
+            print(f"  Warning: could not cache batch ({e})", file=sys.stderr)
+        return items, True
 
     except Exception as e:
         print(f"  Warning: batch failed ({e})", file=sys.stderr)
-        return []
+        return [], False
 
 
 # ──────────────────────────────────────────────────────────────────────
 # DEDUPLICATION
 # ──────────────────────────────────────────────────────────────────────
 
+NORMALIZE_RE = re.compile(r'[^a-z0-9]')
+
+
 def normalize(s: str) -> str:
-    return re.sub(r'[^a-z0-9]', '', s.lower())
+    return NORMALIZE_RE.sub('', s.lower())
+
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Token-set Jaccard similarity at or above which two items count as the same
+NEAR_DUP_THRESHOLD = 0.85
+
+
+def tokens(item: dict) -> frozenset[str]:
+    return frozenset(TOKEN_RE.findall(f"{item.get('title', '')} {item.get('content', '')}".lower()))
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
 
 
 def deduplicate(items: list[dict]) -> list[dict]:
-    """Remove near-duplicate items by normalized title."""
+    """Remove duplicate items by normalized title, then near-duplicates by
+    title + content token overlap within the same category. The first item
+    of each cluster is kept."""
     seen = set()
+    kept_tokens: dict[str, list[frozenset[str]]] = {}
     unique = []
     for item in items:
         key = normalize(item.get('title', ''))
-        if key and key not in seen:
-            seen.add(key)
-            unique.append(item)
+        if not key or key in seen:
+            continue
+
+        toks = tokens(item)
+        peers = kept_tokens.setdefault(item.get('category', ''), [])
+        if any(jaccard(toks, other) >= NEAR_DUP_THRESHOLD for other in peers):
+            continue
+
+        seen.add(key)
+        peers.append(toks)
+        unique.append(item)
     return unique
 
 
+# ──────────────────────────────────────────────────────────────────────
+# INCREMENTAL STATE
+# ──────────────────────────────────────────────────────────────────────
+
+# Where each export was parsed up to, for --incremental runs. An entry holds
+# the byte offset plus a hash of the head of the file, so a replaced (rather
+# than appended-to) export is detected and re-parsed from the start.
+OFFSETS_PATH = Path('.cache/offsets.json')
+HEAD_BYTES = 4096
+
+
+def head_hash(path: str, size: int) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(min(size, HEAD_BYTES))).hexdigest()
+
+
+def resume_offset(path: str, entry: dict | None) -> int:
+    """Byte offset to resume parsing at, or 0 if the file isn't the one we saw."""
+    if not entry or entry['offset'] > os.path.getsize(path):
+        return 0
+    if head_hash(path, entry['offset']) != entry['head']:
+        return 0
+    return entry['offset']
+
+
+def load_offsets() -> dict[str, dict]:
+    if OFFSETS_PATH.exists():
+        return orjson.loads(OFFSETS_PATH.read_bytes())
+    return {}
+
+
+def save_offsets(offsets: dict[str, dict]) -> None:
+    OFFSETS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = OFFSETS_PATH.with_suffix('.tmp')
+    tmp.write_bytes(orjson.dumps(offsets, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, OFFSETS_PATH)
+
+
 # ──────────────────────────────────────────────────────────────────────
 # MAIN
 # ──────────────────────────────────────────────────────────────────────
 
-def main():
+def iter_batches(seq, n: int):
+    """Yield successive lists of up to n items without slicing everything upfront."""
+    it = iter(seq)
+    while batch := list(islice(it, n)):
+        yield batch
+
+
+async def main():
     parser = argparse.ArgumentParser(
         description='Parse WhatsApp group chats into a searchable knowledge base'
     )
@@ -231,7 +502,11 @@ def main():
         '--output', default='../web/public/knowledge.json',
         help='Output JSON path (default: ../web/public/knowledge.json)'
     )
-    parser.add_argument('--batch-size', type=int, default=50, help='Messages per API batch')
+    parser.add_argument('--batch-size', type=int, default=200, help='Messages per API batch')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Only process messages appended since the last run, merging into the existing output'
+    )
     args = parser.parse_args()
 
     api_key = os.environ.get('ANTHROPIC_API_KEY')
@@ -240,27 +515,66 @@ def main():
         print("  export ANTHROPIC_API_KEY=sk-ant-...", file=sys.stderr)
         sys.exit(1)
 
-    client = anthropic.Anthropic(api_key=api_key)
+    client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=5, timeout=60.0)
+
+    out_path = Path(args.output)
 
     # ── Parse all files ──
+    # Exports are append-only, so an incremental run resumes each file at the
+    # offset it was parsed up to last time (or from the start if it shrank)
+    offsets = load_offsets()
+    keys = [str(Path(f).resolve()) for f in args.files]
+    sizes = [os.path.getsize(f) for f in args.files]
+    if args.incremental:
+        starts = [resume_offset(f, offsets.get(key)) for f, key in zip(args.files, keys)]
+    else:
+        starts = [0] * len(args.files)
+
+    # Parsing is CPU-bound regex work, so files go to separate processes
+    names = [Path(f).stem.replace('_', ' ').title() for f in args.files]
+    print(f"Parsing {len(args.files)} files...")
     all_messages = []
-    for f in args.files:
-        name = Path(f).stem.replace('_', ' ').title()
-        print(f"Parsing {f} ({name})...")
-        msgs = parse_file(f, name)
-        print(f"  {len(msgs)} useful messages extracted")
-        all_messages.extend(msgs)
+    with ProcessPoolExecutor() as ex:
+        for f, name, msgs in zip(args.files, names, ex.map(parse_file, args.files, names, starts)):
+            print(f"  {f} ({name}): {len(msgs)} useful messages extracted")
+            all_messages.extend(msgs)
 
     print(f"\nTotal messages to process: {len(all_messages)}")
 
     # ── Process in batches ──
-    batches = [all_messages[i:i+args.batch_size] for i in range(0, len(all_messages), args.batch_size)]
+    # Batches are sliced lazily and fed through a bounded queue, so only about
+    # 2 × CONCURRENCY batches are materialized at any moment
+    n_batches = -(-len(all_messages) // args.batch_size)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=CONCURRENCY)
+    results: list[list[dict]] = [[] for _ in range(n_batches)]
+    failed = 0
+
+    async def worker():
+        nonlocal failed
+        while (job := await queue.get()) is not None:
+            i, batch = job
+            try:
+                results[i], complete = await extract_knowledge(client, batch)
+            except Exception as e:
+                print(f"  Warning: batch failed ({e})", file=sys.stderr)
+                complete = False
+            if not complete:
+                failed += 1
+            print(f"Batch {i+1}/{n_batches} ({len(batch)} msgs) → {len(results[i])} items")
+
+    workers = [asyncio.create_task(worker()) for _ in range(CONCURRENCY)]
+    for job in enumerate(iter_batches(all_messages, args.batch_size)):
+        await queue.put(job)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+    # Results are stored by batch index, so output order stays deterministic.
+    # Existing items go first so dedup keeps them over re-extracted copies.
     all_items = []
-
-    for i, batch in enumerate(batches):
-        print(f"Batch {i+1}/{len(batches)} ({len(batch)} msgs)...", end=' ', flush=True)
-        items = extract_knowledge(client, batch)
-        print(f"→ {len(items)} items")
+    if args.incremental and out_path.exists():
+        all_items.extend(orjson.loads(out_path.read_bytes())['items'])
+    for items in results:
         all_items.extend(items)
 
     # ── Deduplicate ──
@@ -268,14 +582,17 @@ def main():
     print(f"\nTotal: {len(all_items)} raw → {len(unique_items)} after deduplication")
 
     # ── Add IDs ──
-    for i, item in enumerate(unique_items):
-        item['id'] = str(i + 1)
+    # Hash of (category, title) so IDs stay stable across re-runs
+    for item in unique_items:
+        key = f"{item.get('category', '')}|{item.get('title', '')}"
+        item['id'] = hashlib.blake2b(key.encode('utf-8'), digest_size=6).hexdigest()
 
     # ── Sort by category ──
     unique_items.sort(key=lambda x: x.get('category', ''))
 
     # ── Build output ──
-    categories = sorted(set(item.get('category', 'Other') for item in unique_items))
+    counts = Counter(item.get('category', 'Other') for item in unique_items)
+    categories = sorted(counts)
     output = {
         'updated_at': str(date.today()),
         'total': len(unique_items),
@@ -284,16 +601,24 @@ def main():
     }
 
     # ── Save ──
-    out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(output, indent=2, ensure_ascii=False), encoding='utf-8')
+    out_path.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+
+    # Record offsets only once the output is safely written, and only if every
+    # batch succeeded; otherwise the next --incremental run would skip the
+    # messages of the failed batches for good
+    if failed:
+        print(f"\n  {failed} batch(es) failed; parse offsets not advanced", file=sys.stderr)
+    else:
+        for f, key, size in zip(args.files, keys, sizes):
+            offsets[key] = {'offset': size, 'head': head_hash(f, size)}
+        save_offsets(offsets)
 
     print(f"\n✓ Saved to {out_path}")
     print(f"  {len(unique_items)} items across {len(categories)} categories:")
     for cat in categories:
-        count = sum(1 for i in unique_items if i.get('category') == cat)
-        print(f"  · {cat}: {count}")
+        print(f"  · {cat}: {counts[cat]}")
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())